@@ -1,9 +1,16 @@
+import json
+import os
+
 import dash
-from dash import dcc, html, dash_table, Input, Output
+from dash import dcc, html, dash_table, Input, Output, Patch, ctx
 import geopandas as gpd
 import pandas as pd
+import pyarrow as pa
 import plotly.express as px
+import plotly.graph_objects as go
 import mapclassify as mc
+import numpy as np
+import shapely
 
 # ===========================================================
 # NOTA IMPORTANTE:
@@ -12,48 +19,138 @@ import mapclassify as mc
 #
 #   import geopandas as gpd
 #   shapefile_path = "MGN2024_MPIO_POLITICO/MGN_ADM_MPIO_GRAFICO.shp"
-#   gdf = gpd.read_file(shapefile_path, encoding="utf-8")
+#   gdf = gpd.read_file(shapefile_path, encoding="utf-8", engine="pyogrio", use_arrow=True)
 #   antioquia = gdf[gdf['dpto_cnmbr'] == 'ANTIOQUIA']
 #   antioquia.to_file("antioquia.json", driver="GeoJSON")
 #
 # Esto generará un archivo "antioquia.json" mucho más liviano para usar en GitHub/Render
+#
+# A partir de ese archivo y del CSV, prepare_data.py genera los datos que se cargan aquí:
+#
+#   python prepare_data.py
 # ===========================================================
 
 # =========================
 # Cargar shapefile y dataset
 # =========================
-antioquia = gpd.read_file("antioquia_shp.geojson")
-df = pd.read_csv("Mortalidad_General_en_el_departamento_de_Antioquia_desde_2005_20250913.csv")
+# Lectura con pyogrio y Arrow
+antioquia = gpd.read_file("antioquia_simplified.geojson", engine="pyogrio", use_arrow=True,
+                          columns=["mpio_cdpmp", "mpio_cnmbr"])
+# Dataset ya limpio y tipado por prepare_data.py
+df = pd.read_parquet("mortalidad.parquet")
 
-# Normalización de columnas
-df.columns = df.columns.str.lower().str.replace(" ", "_")
 # Asegurar formato de códigos (relleno con ceros a 5 dígitos)
-if "codigomunicipio" in df.columns:
-    df["codigomunicipio"] = df["codigomunicipio"].astype(str).str.zfill(5)
-
 if "mpio_cdpmp" in antioquia.columns:
-    antioquia["mpio_cdpmp"] = antioquia["mpio_cdpmp"].astype(str).str.zfill(5)
-if "tasaxmilhabitantes" in df.columns:
-    # Si hay tasa y población pero faltan casos
-    if "poblacion" in df.columns and "numerocasos" not in df.columns:
-        df["numerocasos"] = (df["tasaxmilhabitantes"] * df["poblacion"]) / 1000
-
-    # Si hay tasa y casos pero falta población
-    if "numerocasos" in df.columns and "poblacion" not in df.columns:
-        df["poblacion"] = (df["numerocasos"] * 1000) / df["tasaxmilhabitantes"]
-resumen = df.groupby("codigomunicipio").agg(
-    casos_totales=("numerocasos", "sum"),
-    poblacion_total=("poblacion", "sum")
-).reset_index()
-resumen["tasa_x_mil"] = resumen["casos_totales"] / resumen["poblacion_total"] * 1000
+    antioquia["mpio_cdpmp"] = np.char.mod("%05d", antioquia["mpio_cdpmp"].astype("int64").to_numpy())
+# Resumen por municipio precalculado por prepare_data.py
+resumen = pd.read_parquet("resumen_municipios.parquet")
+
+# Mismo tipo categórico para el código de municipio en el mapa, el dataset y el resumen
+codigos_dtype = pd.CategoricalDtype(sorted(
+    set(antioquia["mpio_cdpmp"]) | set(df["codigomunicipio"].cat.categories)
+))
+antioquia["mpio_cdpmp"] = antioquia["mpio_cdpmp"].astype(codigos_dtype)
+df["codigomunicipio"] = df["codigomunicipio"].astype(codigos_dtype)
+resumen["codigomunicipio"] = resumen["codigomunicipio"].astype(codigos_dtype)
 
 top10 = resumen.merge(df[["codigomunicipio", "nombremunicipio"]].drop_duplicates(),
                       on="codigomunicipio", how="left")
 top10 = top10.nlargest(10, "tasa_x_mil")
+
+# Resumen del dataset (va directamente en el layout)
+resumen_dataset = {
+    "Filas": df.shape[0],
+    "Columnas": df.shape[1],
+    "Valores faltantes": int(np.count_nonzero(df.isna().to_numpy())),
+    "Rango de años": f"{df['año'].min()} - {df['año'].max()}" if "año" in df.columns else "No disponible"
+}
+
+# Tablas descriptivas del análisis estadístico
+desc_num = round(df.describe(), 2).reset_index()
+# Los códigos se describen como texto: con la categoría, el desempate de "top" cambia
+desc_cat = round(df.astype({"codigomunicipio": str}).describe(include=["object"]), 2).reset_index()
+
+# Registros de las tablas vía Arrow (la tabla categórica mezcla tipos y usa to_dict)
+preview_records = pa.Table.from_pandas(df.head(10), preserve_index=False).to_pylist()
+desc_num_records = pa.Table.from_pandas(desc_num, preserve_index=False).to_pylist()
+
+# Datos del mapa: atributos municipales sin geometrías
+antioquia_data = pd.DataFrame(antioquia.drop(columns="geometry"))
+# Columnas del resumen alineadas por código de municipio
+columnas_resumen = ["casos_totales", "poblacion_total", "tasa_x_mil"]
+antioquia_data[columnas_resumen] = (
+    resumen.set_index("codigomunicipio")[columnas_resumen]
+    .reindex(antioquia_data["mpio_cdpmp"])
+    .to_numpy()
+)
+# GeoJSON del mapa con el código de municipio como id de cada feature
+antioquia_geojson = {
+    "type": "FeatureCollection",
+    "features": [
+        {"id": codigo, "type": "Feature", "properties": {}, "geometry": json.loads(geometria)}
+        for codigo, geometria in zip(antioquia["mpio_cdpmp"].astype(str),
+                                     shapely.to_geojson(antioquia.geometry.values))
+    ]
+}
+
+# Tasas del mapa como array contiguo de float32 (la clasificación recorre la mitad de bytes)
+antioquia_data["tasa_x_mil"] = antioquia_data["tasa_x_mil"].astype("float32")
+tasas = np.ascontiguousarray(antioquia_data["tasa_x_mil"].to_numpy())
+sin_tasa = np.isnan(tasas)
+tasa_valores = tasas[~sin_tasa]
+# Cortes de cada esquema de clasificación
+map_bins = {
+    "quantiles": mc.Quantiles(tasa_valores, k=5).bins,
+    "jenks": mc.FisherJenks(tasa_valores, k=5).bins
+}
+# Clase de cada municipio: np.digitize(right=True) recortado a la última clase equivale a
+# scheme.find_bin; los municipios sin tasa quedan en NaN para que el mapa no los pinte
+map_clases = {
+    nombre: np.where(sin_tasa, np.nan, np.minimum(np.digitize(tasas, bins, right=True), len(bins) - 1))
+    for nombre, bins in map_bins.items()
+}
+
+# Valores del mapa para cada opción de los controles
+paletas = {"Rojo": "Reds", "Azul": "Blues", "Verde": "Greens", "Viridis": "Viridis"}
+map_escalas = {
+    paleta: px.colors.make_colorscale(getattr(px.colors.sequential, paleta))
+    for paleta in paletas.values()
+}
+map_valores = {
+    "continuous": (tasas, "tasa_x_mil"),
+    **{nombre: (clases, "clase") for nombre, clases in map_clases.items()}
+}
+map_etiquetas = {
+    True: (antioquia_data["mpio_cnmbr"].to_numpy(), "%{text}<br>Tasa: %{customdata[0]:.2f}"),
+    False: (None, None)
+}
+
+# Figura base del mapa con los valores por defecto de los controles
+mapa_base = go.Figure(go.Choroplethmapbox(
+    geojson=antioquia_geojson,
+    locations=antioquia_data["mpio_cdpmp"].to_numpy(),
+    z=tasas,
+    colorscale=map_escalas["Viridis"],
+    colorbar={"title": {"text": "tasa_x_mil"}},
+    customdata=tasas[:, None]
+))
+mapa_base.update_layout(
+    mapbox_style="carto-positron",
+    mapbox_center={"lat": 6.5, "lon": -75.5},
+    mapbox_zoom=6,
+    margin={"l": 0, "r": 0, "t": 0, "b": 0},
+    uirevision="static"
+)
+# Se guarda como dict para no copiar el GeoJSON en cada carga de página
+mapa_base = mapa_base.to_dict()
+
 # =========================
 # Configuración de Dash
 # =========================
 app = dash.Dash(__name__)
+# En producción (Render) se sirve con gunicorn:
+#
+#   gunicorn --preload -w ${WEB_CONCURRENCY:-2} -k gthread --threads 4 app:server
 server = app.server
 
 # =========================
@@ -78,13 +175,13 @@ app.layout = html.Div([
     html.Br(),
 
     html.H3("Resumen del dataset inicial"),
-    html.Div(id="summaryText"),
+    html.Div(id="summaryText", children=html.Ul([html.Li(f"{k}: {v}") for k, v in resumen_dataset.items()])),
     html.Br(),
     html.H3("Vista previa"),
     dash_table.DataTable(
         id="dataTable",
         columns=[{"name": i, "id": i} for i in df.columns],
-        data=df.head(10).to_dict("records"),
+        data=preview_records,
         page_size=5,
         style_table={"overflowX": "auto"}
     )
@@ -135,19 +232,19 @@ app.layout = html.Div([
             ], style={"display": "flex", "justifyContent": "center"}),
             html.H3("Boxplot de la tasa por mil habitantes"),
             dcc.Graph(
-                figure=px.box(df, y="tasaxmilhabitantes",
+                figure=px.box(df[["tasaxmilhabitantes"]], y="tasaxmilhabitantes",
                               title="Distribución de la tasa de mortalidad por mil habitantes")
             ), html.H3("Resumen de variables numéricas"),
         dash_table.DataTable(
-        data=round(df.describe(), 2).reset_index().to_dict("records"),
-        columns=[{"name": i, "id": i} for i in round(df.describe(), 2).reset_index().columns],
+        data=desc_num_records,
+        columns=[{"name": i, "id": i} for i in desc_num.columns],
         style_table={"overflowX": "auto"},
         style_cell={'textAlign': 'center'}
     ),
             html.H3("Resumen de variables categóricas"),
             dash_table.DataTable(
-                data=round(df.describe(include="object"), 2).reset_index().to_dict("records"),
-                columns=[{"name": i, "id": i} for i in round(df.describe(include="object"), 2).reset_index().columns],
+                data=desc_cat.to_dict("records"),
+                columns=[{"name": i, "id": i} for i in desc_cat.columns],
                 style_table={"overflowX": "auto"}
             ),
 
@@ -174,13 +271,9 @@ app.layout = html.Div([
                 ),
                 dcc.Dropdown(
                     id="colorPalette",
-                    options=[
-                        {"label": "Rojo", "value": "Reds"},
-                        {"label": "Azul", "value": "Blues"},
-                        {"label": "Verde", "value": "Greens"},
-                        {"label": "Viridis", "value": "Viridis"}
-                    ],
-                    value="Viridis"
+                    options=[{"label": nombre, "value": paleta} for nombre, paleta in paletas.items()],
+                    value="Viridis",
+                    clearable=False
                 ),
                 dcc.Dropdown(
                     id="mapClass",
@@ -189,9 +282,11 @@ app.layout = html.Div([
                         {"label": "Quantiles", "value": "quantiles"},
                         {"label": "Natural Jenks", "value": "jenks"}
                     ],
-                    value="continuous"
+                    value="continuous",
+                    clearable=False
                 ),
-                dcc.Graph(id="mapPlot")
+                dcc.Graph(id="mapPlot", figure=mapa_base,
+                          config={"scrollZoom": True, "doubleClick": "reset+autosize"})
             ])
         ]),
         dcc.Tab(label="Análisis de Mapas", children=[
@@ -235,90 +330,47 @@ app.layout = html.Div([
 # Callbacks
 # =========================
 
-# Resumen del dataset
-@app.callback(
-    Output("summaryText", "children"),
-    Input("dataTable", "data")
-)
-def update_summary(_):
-    resumen = {
-        "Filas": df.shape[0],
-        "Columnas": df.shape[1],
-        "Valores faltantes": int(df.isna().sum().sum()),
-        "Rango de años": f"{df['año'].min()} - {df['año'].max()}" if "año" in df.columns else "No disponible"
-    }
-
-    return html.Ul([html.Li(f"{k}: {v}") for k, v in resumen.items()])
-
-
-# Actualización del mapa
+# Actualización del mapa: solo se parchea lo que depende del control que cambió
 @app.callback(
     Output("mapPlot", "figure"),
     Input("colorPalette", "value"),
-    Input("show_labels", "value"),
-    Input("mapClass", "value")
+    Input("mapClass", "value"),
+    prevent_initial_call=True
 )
-def update_map(colorPalette, show_labels, mapClass):
-    # Resumen de casos y población
-    resumen = df.groupby("codigomunicipio").agg(
-        casos_totales=("numerocasos", "sum"),
-        poblacion_total=("poblacion", "sum")
-    ).reset_index()
-    resumen["tasa_x_mil"] = resumen["casos_totales"] / resumen["poblacion_total"] * 1000
-
-    antioquia_data = antioquia.merge(
-        resumen, left_on="mpio_cdpmp", right_on="codigomunicipio", how="left"
-    )
+def update_map(colorPalette, mapClass):
+    trigger = ctx.triggered_id
+    patched = Patch()
+
+    # Paleta de colores (si el dropdown queda vacío se usa Viridis)
+    if trigger == "colorPalette":
+        patched["data"][0]["colorscale"] = map_escalas[colorPalette or "Viridis"]
 
     # =========================
     # Clasificación de mapas
     # =========================
-    color_col = "tasa_x_mil"
-    if mapClass == "quantiles":
-        scheme = mc.Quantiles(antioquia_data["tasa_x_mil"].dropna(), k=5)
-        antioquia_data["clase"] = scheme.find_bin(antioquia_data["tasa_x_mil"])
-        color_col = "clase"
-    elif mapClass == "jenks":
-        scheme = mc.NaturalBreaks(antioquia_data["tasa_x_mil"].dropna(), k=5)
-        antioquia_data["clase"] = scheme.find_bin(antioquia_data["tasa_x_mil"])
-        color_col = "clase"
-
-    # Convertir GeoDataFrame a GeoJSON
-    geojson = antioquia_data.__geo_interface__
-
-    # Figura según tipo de clasificación
-    if mapClass == "continuous":
-        fig = px.choropleth_mapbox(
-            antioquia_data,
-            geojson=geojson,
-            locations=antioquia_data.index,
-            color=color_col,
-            mapbox_style="carto-positron",
-            center={"lat": 6.5, "lon": -75.5},
-            zoom=6,
-            color_continuous_scale=colorPalette
-        )
-    else:
-        fig = px.choropleth_mapbox(
-            antioquia_data,
-            geojson=geojson,
-            locations=antioquia_data.index,
-            color=color_col,
-            mapbox_style="carto-positron",
-            center={"lat": 6.5, "lon": -75.5},
-            zoom=6,
-            color_discrete_sequence=getattr(px.colors.sequential, colorPalette) 
-        )
-
-    # Etiquetas
-    fig.update_traces(
-        text=antioquia_data["mpio_cnmbr"] if "yes" in show_labels else None,
-        customdata=antioquia_data[["tasa_x_mil"]] if "tasa_x_mil" in antioquia_data else None,
-        hovertemplate="%{text}<br>Tasa: %{customdata[0]:.2f}" if "yes" in show_labels else None
-    )
+    if trigger == "mapClass":
+        z, titulo = map_valores[mapClass or "continuous"]
+        patched["data"][0]["z"] = z
+        patched["data"][0]["colorbar"]["title"]["text"] = titulo
+
+    return patched
+
+
+# Etiquetas: mostrar u ocultar los nombres de los municipios
+@app.callback(
+    Output("mapPlot", "figure", allow_duplicate=True),
+    Input("show_labels", "value"),
+    prevent_initial_call=True
+)
+def update_labels(show_labels):
+    patched = Patch()
+    text, hovertemplate = map_etiquetas["yes" in show_labels]
+    patched["data"][0]["text"] = text
+    patched["data"][0]["hovertemplate"] = hovertemplate
 
-    return fig
+    return patched
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    # Modo debug solo si se pide (DASH_DEBUG=1) y sin reloader
+    app.run(debug=os.getenv("DASH_DEBUG") == "1", use_reloader=False)
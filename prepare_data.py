@@ -0,0 +1,75 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+# ===========================================================
+# Preparación de datos (se ejecuta una sola vez, no en el servidor):
+#
+#   python prepare_data.py
+#
+# Genera los archivos que carga app.py al arrancar:
+#   - mortalidad.parquet: el CSV de mortalidad ya limpio y con tipos definidos
+#   - resumen_municipios.parquet: casos, población y tasa acumulados por municipio
+#   - antioquia_simplified.geojson: los polígonos municipales simplificados
+# ===========================================================
+
+# =========================
+# Dataset de mortalidad
+# =========================
+# Lectura del CSV con el motor de Arrow
+df = pd.read_csv("Mortalidad_General_en_el_departamento_de_Antioquia_desde_2005_20250913.csv",
+                 engine="pyarrow")
+
+# Normalización de columnas
+df.columns = df.columns.str.lower().str.replace(" ", "_")
+# Asegurar formato de códigos (relleno con ceros a 5 dígitos), guardados como categoría
+if "codigomunicipio" in df.columns:
+    codigos = df["codigomunicipio"].astype("int64").to_numpy()
+    df["codigomunicipio"] = pd.Categorical(np.char.mod("%05d", codigos))
+
+# Completar casos o población a partir de la tasa (solo si falta la columna)
+if "tasaxmilhabitantes" in df.columns:
+    tasa = df["tasaxmilhabitantes"].to_numpy(dtype="float64")
+
+    # Si hay tasa y población pero faltan casos
+    if "poblacion" in df.columns and "numerocasos" not in df.columns:
+        casos = np.multiply(tasa, df["poblacion"].to_numpy(dtype="float64"))
+        df["numerocasos"] = np.divide(casos, 1000, out=casos)
+
+    # Si hay tasa y casos pero falta población (con tasa 0 la población no se puede despejar)
+    if "numerocasos" in df.columns and "poblacion" not in df.columns:
+        poblacion = np.multiply(df["numerocasos"].to_numpy(dtype="float64"), 1000)
+        df["poblacion"] = np.divide(poblacion, tasa, out=np.full_like(poblacion, np.nan), where=tasa != 0)
+
+# Tipos compactos para casos (redondeados a entero), año y región; la tasa y la población
+# se quedan en float64 para mostrar los mismos valores que el CSV
+if "numerocasos" in df.columns:
+    df["numerocasos"] = np.rint(df["numerocasos"].to_numpy(dtype="float64"))
+tipos = {"numerocasos": "int32", "año": "int16", "codigoregion": "int8"}
+df = df.astype({col: tipo for col, tipo in tipos.items() if col in df.columns})
+df.to_parquet("mortalidad.parquet", index=False)
+
+# =========================
+# Resumen por municipio
+# =========================
+# Casos y población acumulados por municipio
+codigos, municipios = pd.factorize(df["codigomunicipio"], sort=True)
+casos_totales = np.bincount(codigos, weights=df["numerocasos"].to_numpy())
+poblacion_total = np.bincount(codigos, weights=df["poblacion"].to_numpy())
+resumen = pd.DataFrame({
+    "codigomunicipio": municipios,
+    "casos_totales": casos_totales,
+    "poblacion_total": poblacion_total,
+    "tasa_x_mil": casos_totales / poblacion_total * 1000
+})
+resumen.to_parquet("resumen_municipios.parquet", index=False)
+
+# =========================
+# Polígonos municipales
+# =========================
+# Solo el código y el nombre del municipio; las geometrías se simplifican conservando los
+# bordes compartidos y las coordenadas se guardan con 6 decimales (~10 cm)
+antioquia = gpd.read_file("antioquia_shp.geojson", engine="pyogrio", use_arrow=True,
+                          columns=["mpio_cdpmp", "mpio_cnmbr"])
+antioquia["geometry"] = antioquia.geometry.simplify_coverage(tolerance=0.001)
+antioquia.to_file("antioquia_simplified.geojson", driver="GeoJSON", COORDINATE_PRECISION=6)